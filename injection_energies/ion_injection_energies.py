@@ -1,6 +1,7 @@
 """
 Module to calculate and store injection energies for all ions
 """
+import numpy as np
 import pandas as pd
 from injector_model import InjectionEnergies
 
@@ -37,6 +38,18 @@ inj_energies3.calculate_all_gammas()
 inj_energies3.print_all_gammas()
 
 
+def save_energy_table(df, name):
+    """
+    Save injection energy table as csv and, for fast lookup in InjectorChain, 
+    the reference gammas per ion key as npz
+    """
+    df.to_csv('../data/{}.csv'.format(name), index=False)
+    np.savez('../data/{}.npz'.format(name), 
+             ion_codes=df['Ion'].to_numpy(dtype=str), 
+             energies=df[['LEIR_gamma_inj', 'LEIR_gamma_extr', 'PS_gamma_inj', 
+                          'PS_gamma_extr', 'SPS_gamma_inj', 'SPS_gamma_extr']].to_numpy(dtype=float))
+
+
 # Initiate empty dictionaries
 all_data = []
 all_data_LEIR_PS = []
@@ -110,14 +123,14 @@ for i, row in df.iterrows():
 
 # Convert all the data to a big dataframe
 df = pd.DataFrame(all_data)
-df.to_csv('../data/ion_injection_energies_PS_SPS_strip.csv', index=False)
+save_energy_table(df, 'ion_injection_energies_PS_SPS_strip')
 
 df_LEIR_PS = pd.DataFrame(all_data_LEIR_PS)
-df_LEIR_PS.to_csv('../data/ion_injection_energies_LEIR_PS_strip.csv', index=False)
+save_energy_table(df_LEIR_PS, 'ion_injection_energies_LEIR_PS_strip')
 
 df_Brho = pd.DataFrame(all_data_Brho)
-df_Brho.to_csv('../data/ion_injection_energies_PS_SPS_strip_higher_brho_LEIR.csv', index=False)
+save_energy_table(df_Brho, 'ion_injection_energies_PS_SPS_strip_higher_brho_LEIR')
 
 df_LEIR_PS_Brho = pd.DataFrame(all_data_LEIR_PS_Brho)
-df_LEIR_PS_Brho.to_csv('../data/ion_injection_energies_LEIR_PS_strip_higher_brho_LEIR.csv', index=False)
+save_energy_table(df_LEIR_PS_Brho, 'ion_injection_energies_LEIR_PS_strip_higher_brho_LEIR')
 
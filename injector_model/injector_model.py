@@ -7,8 +7,132 @@ Simulation model of the CERN Injector Chain for different ions
 import pandas as pd
 import numpy as np
 import math
+import os
+from functools import lru_cache
+from collections import namedtuple
 from scipy.constants import e
-from collections import defaultdict
+
+try:
+    from numba import njit
+except ImportError:
+    # numba is optional - without it the kernels below run as plain Python functions
+    def njit(*args, **kwargs):
+        if len(args) == 1 and callable(args[0]):
+            return args[0]
+        return lambda func: func
+
+
+# Ion properties of a single ion species, as plain floats
+IonParams = namedtuple('IonParams', ['m', 'Z', 'A', 'Q', 'linac3_I', 'linac3_T', 'LEIR_PS_eff'])
+
+
+# Reference gamma columns of the ion injection energy tables, in the order of the lookup table arrays
+_energy_columns = ['LEIR_gamma_inj', 'LEIR_gamma_extr', 'PS_gamma_inj', 
+                   'PS_gamma_extr', 'SPS_gamma_inj', 'SPS_gamma_extr']
+
+
+def _energy_table_path(LEIR_PS_strip, higher_brho_LEIR, extension):
+    """
+    Path of ion injection energy table for given stripping and LEIR magnetic rigidity scenario
+    """
+    strip_string = 'LEIR_PS' if LEIR_PS_strip else 'PS_SPS'
+    brho_string = '_higher_brho_LEIR' if higher_brho_LEIR else ''
+    return '../data/ion_injection_energies_{}_strip{}.{}'.format(strip_string, brho_string, extension)
+
+
+@lru_cache(maxsize=8)
+def _read_energy_csv(path, mtime):
+    """
+    Ion injection energy table, parsed once per file version and shared between instances - do not modify
+    """
+    return pd.read_csv(path, index_col=0)
+
+
+def _load_energy_csv(LEIR_PS_strip, higher_brho_LEIR):
+    """
+    Ion injection energy table for given stripping and LEIR magnetic rigidity scenario - do not modify
+    """
+    path = _energy_table_path(LEIR_PS_strip, higher_brho_LEIR, 'csv')
+    return _read_energy_csv(path, os.path.getmtime(path))
+
+
+def _energy_lut_from_table(ion_energy_data):
+    """
+    Reference gammas per ion key as arrays in the order of _energy_columns, from ion injection energy table
+    """
+    return dict(zip(ion_energy_data.index, ion_energy_data[_energy_columns].to_numpy(dtype=float)))
+
+
+@lru_cache(maxsize=8)
+def _read_energy_lut(path, mtime):
+    """
+    Reference gammas per ion key from .npz or csv table, read once per file version and shared between instances
+    """
+    if path.endswith('.npz'):
+        with np.load(path) as data:
+            return dict(zip(data['ion_codes'].tolist(), data['energies']))
+    return _energy_lut_from_table(_read_energy_csv(path, mtime))
+
+
+def _load_energy_lut(LEIR_PS_strip, higher_brho_LEIR):
+    """
+    Reference gammas per ion key for given stripping and LEIR magnetic rigidity scenario
+    - read from the .npz table written by injection_energies/ion_injection_energies.py if present 
+    and at least as new as the csv table, otherwise from the csv table
+    """
+    csv_path = _energy_table_path(LEIR_PS_strip, higher_brho_LEIR, 'csv')
+    npz_path = _energy_table_path(LEIR_PS_strip, higher_brho_LEIR, 'npz')
+    if os.path.isfile(npz_path) and (not os.path.isfile(csv_path) 
+                                     or os.path.getmtime(npz_path) >= os.path.getmtime(csv_path)):
+        path = npz_path
+    else:
+        path = csv_path
+    return _read_energy_lut(path, os.path.getmtime(path))
+
+
+@njit(cache=True, fastmath=True)
+def _beta(gamma):
+    """
+    Relativistic beta factor from scalar gamma factor
+    """
+    return math.sqrt(1 - 1/(gamma*gamma))
+
+
+@njit(cache=True, fastmath=True)
+def _space_charge_scaling_factor(Nb, m, gamma, charge, epsilon, sigma_z):
+    """
+    Linear space charge tune shift scaling for scalar input, without constants
+    """
+    return Nb*charge*charge/(m*_beta(gamma)*gamma*gamma*epsilon*sigma_z)
+
+
+@njit(cache=True, fastmath=True)
+def _linear_limit(m, gamma, Nb_0, charge, charge_0, m_0, gamma_0, beta_0):
+    """
+    Linear space charge intensity limit for scalar input, scaled from reference ion 
+    values Nb_0, charge_0, m_0, gamma_0 and precomputed reference beta_0
+    """
+    charge_ratio = charge_0/charge
+    gamma_ratio = gamma/gamma_0
+    return Nb_0*(m/m_0)*charge_ratio*charge_ratio*(_beta(gamma)/beta_0)*gamma_ratio*gamma_ratio
+
+
+@njit(cache=True, fastmath=True)
+def _lin_limit(m, gamma, k, q):
+    """
+    Linear space charge intensity limit with the reference ion values folded into 
+    k = Nb0*q0**2/(m0*beta0*gamma0**2) - works elementwise on numpy arrays
+    """
+    beta = np.sqrt(1 - 1/(gamma*gamma))
+    return k*m*beta*gamma*gamma/(q*q)
+
+
+def _lin_limit_constant(Nb0, q0, m0, beta0, gamma0):
+    """
+    Reference ion constant k of _lin_limit
+    """
+    return Nb0*q0*q0/(m0*beta0*gamma0*gamma0)
+
 
 class InjectorChain:
     """
@@ -16,6 +140,25 @@ class InjectorChain:
     to calculte maximum intensity limits
     following Roderik Bruce's example from 2021
     """
+    # Kinetic energy per nucleon in GeV, same for all species - known Pb ion values from LIU report on 
+    # https://edms.cern.ch/ui/file/1420286/2/LIU-Ions_beam_parameter_table.pdf
+    E_kin_per_A_LEIR_inj = 4.2e-3 # kinetic energy per nucleon in LEIR before RF capture, same for all species
+    E_kin_per_A_LEIR_extr = 7.22e-2 # kinetic energy per nucleon in LEIR at exit, same for all species
+    E_kin_per_A_PS_inj = 7.22e-2 # GeV/nucleon according to LIU design report 
+    E_kin_per_A_PS_extr = 5.9 # GeV/nucleon according to LIU design report 
+    E_kin_per_A_SPS_inj = 5.9 # GeV/nucleon according to LIU design report 
+    E_kin_per_A_SPS_extr = 176.4 # GeV/nucleon according to LIU design report 
+    
+    # Pb reference ion mass and relativistic gammas, gamma = 1 + E_kin_per_A*A/m
+    m0_GeV = 193.687 # rest mass in GeV for Pb reference case 
+    gamma0_LEIR_inj = 1 + E_kin_per_A_LEIR_inj * 208/m0_GeV
+    gamma0_LEIR_extr = 1 + E_kin_per_A_LEIR_extr * 208/m0_GeV
+    gamma0_PS_inj = 1 + E_kin_per_A_PS_inj * 208/m0_GeV
+    gamma0_PS_extr = 1 + E_kin_per_A_PS_extr * 208/m0_GeV
+    gamma0_SPS_inj = 1 + E_kin_per_A_SPS_inj * 208/m0_GeV
+    gamma0_SPS_extr = 1 + E_kin_per_A_SPS_extr * 208/m0_GeV
+    _pb_refs_done = False  # remaining Pb reference values are set by _pb_reference_values
+    
     def __init__(self, ion_type, 
                  ion_data, 
                  ion_type_ref='Pb',
@@ -32,15 +175,12 @@ class InjectorChain:
         self.full_ion_data = ion_data
         self.LEIR_PS_strip = LEIR_PS_strip
         self.higher_brho_LEIR = higher_brho_LEIR
-        brho_string = '_higher_brho_LEIR' if self.higher_brho_LEIR else ''
 
         # Check whether to load relativistic gamma data from injection_energies
         self.use_gammas_ref = use_gammas_ref
-        # Load ion energy data depending on where stripping is made 
-        if self.LEIR_PS_strip:
-            self.ion_energy_data = pd.read_csv('../data/ion_injection_energies_LEIR_PS_strip{}.csv'.format(brho_string), index_col=0)
-        else:
-            self.ion_energy_data = pd.read_csv('../data/ion_injection_energies_PS_SPS_strip{}.csv'.format(brho_string), index_col=0)
+        # Load reference gammas per ion key depending on where stripping is made, full table only when accessed
+        self._ion_energy_data = None
+        self._energy_lut = _load_energy_lut(bool(self.LEIR_PS_strip), bool(self.higher_brho_LEIR))
 
         self.init_ion(ion_type)
         self.debug_mode = False
@@ -71,25 +211,61 @@ class InjectorChain:
             print("Q = {}, Z = {}\n".format(self.Q, self.Z))
 
 
+    @property
+    def full_ion_data(self):
+        """
+        Ion data table with ion types as columns
+        """
+        return self._full_ion_data
+    
+    
+    @full_ion_data.setter
+    def full_ion_data(self, ion_data):
+        """
+        Set ion data table and extract ion properties - as record array for vectorized calculations, 
+        and as IonParams per ion type for init_ion
+        """
+        self._full_ion_data = ion_data
+        self._ion_names = ion_data.columns
+        self._props = np.rec.fromarrays([ion_data.loc['mass [GeV]'].to_numpy(dtype=float),
+                                         ion_data.loc['Z'].to_numpy(dtype=float),
+                                         ion_data.loc['A'].to_numpy(dtype=float),
+                                         ion_data.loc['Q before stripping'].to_numpy(dtype=float),
+                                         ion_data.loc['Linac3 current [uA]'].to_numpy(dtype=float),
+                                         ion_data.loc['Linac3 pulse length [us]'].to_numpy(dtype=float),
+                                         ion_data.loc['LEIR-PS Stripping Efficiency'].to_numpy(dtype=float)],
+                                        names=IonParams._fields)
+        self._ion_params = {name: IonParams(*row) for name, row in zip(self._ion_names, self._props.tolist())}
+    
+    
+    @property
+    def ion_data(self):
+        """
+        Ion data of current ion type, as column of full ion data table
+        """
+        return self.full_ion_data[self.ion_type]
+
+
     def init_ion(self, ion_type):
         """
         Initialize ion species for a given type 
         """
         self.ion_type = ion_type
-        self.ion_data = self.full_ion_data[ion_type]
-        self.mass_GeV = self.ion_data['mass [GeV]']
-        self.Z = self.ion_data['Z']
-        self.A = self.ion_data['A']
-        self.Q = self.ion_data['Q before stripping']
+        self._ion = self._ion_params[ion_type]
+        self.mass_GeV = self._ion.m
+        self.Z = self._ion.Z
+        self.A = self._ion.A
+        self.Q = self._ion.Q
+        self.A_over_m = self.A/self.mass_GeV  # shared by all gammas, gamma = 1 + E_kin_per_A*A/m
         
         # Values from first tables in Roderik's notebook
-        self.linac3_current = self.ion_data['Linac3 current [uA]'] * 1e-6
-        self.linac3_pulseLength = self.ion_data['Linac3 pulse length [us]'] * 1e-6
+        self.linac3_current = self._ion.linac3_I * 1e-6
+        self.linac3_pulseLength = self._ion.linac3_T * 1e-6
 
         # General rules - stripping and transmission
         self.LEIR_injection_efficiency = 0.5
         self.LEIR_transmission = 0.8
-        self.LEIR_PS_stripping_efficiency = self.ion_data['LEIR-PS Stripping Efficiency']
+        self.LEIR_PS_stripping_efficiency = self._ion.LEIR_PS_eff
         self.PS_transmission = 0.9
         self.PS_SPS_transmission_efficiency = 1.0 # 0.9 is what we see today, but Roderik uses 1.0
         self.PS_SPS_strip = not self.LEIR_PS_strip  # if we have LEIR-PS stripping, no stripping PS-SPS
@@ -102,29 +278,45 @@ class InjectorChain:
             self.load_ion_energy()
 
 
+    @property
+    def ion_energy_data(self):
+        """
+        Full ion injection energy table depending on where stripping is made, 
+        copied for this instance on first access
+        """
+        if self._ion_energy_data is None:
+            self._ion_energy_data = _load_energy_csv(bool(self.LEIR_PS_strip), bool(self.higher_brho_LEIR)).copy()
+        return self._ion_energy_data
+    
+    
+    @ion_energy_data.setter
+    def ion_energy_data(self, ion_energy_data):
+        """
+        Replace ion injection energy table - reference gammas are loaded from it at the next init_ion
+        """
+        self._ion_energy_data = ion_energy_data
+        self._energy_lut = _energy_lut_from_table(ion_energy_data)
+    
+    
     def load_ion_energy(self):
         """
         Loads calculated ion energies for each ion type from the ion_injection_energies module
         """
         key = str(int(self.Q)) + self.ion_type + str(int(self.A))
-        ion_energy = self.ion_energy_data.loc[key]
         
         # Load reference injection energies
-        self.LEIR_gamma_inj_ref = ion_energy['LEIR_gamma_inj']
-        self.LEIR_gamma_extr_ref = ion_energy['LEIR_gamma_extr']
-        self.PS_gamma_inj_ref = ion_energy['PS_gamma_inj']
-        self.PS_gamma_extr_ref = ion_energy['PS_gamma_extr']
-        self.SPS_gamma_inj_ref = ion_energy['SPS_gamma_inj']
-        self.SPS_gamma_extr_ref = ion_energy['SPS_gamma_extr']
+        (self.LEIR_gamma_inj_ref, self.LEIR_gamma_extr_ref, 
+         self.PS_gamma_inj_ref, self.PS_gamma_extr_ref,
+         self.SPS_gamma_inj_ref, self.SPS_gamma_extr_ref) = self._energy_lut[key]
 
     def beta(self, gamma):
         """
         Relativistic beta factor from gamma factor 
         """
-        return np.sqrt(1 - 1/gamma**2)
+        return _beta(gamma)
     
     
-    def spaceChargeScalingFactor(self, Nb, m, gamma, epsilon, sigma_z, fully_stripped=True):
+    def spaceChargeScalingFactor(self, Nb, m, gamma, charge, epsilon, sigma_z):
         """
         Approximate scaling equation for linear space charge tune shift, 
         from Eq (1) in Hannes' and Isabelle's space charge report
@@ -132,96 +324,101 @@ class InjectorChain:
         (assuming lattice integral is constant and that this scaling 
         stays constant, i.e. with  the same space charge tune shift 
         - for now we ignore constants for a simpler expression
+        - charge is Z if fully stripped ion, otherwise Q
         """
-        # Specify if fully stripped ion or not
-        if fully_stripped:
-            charge = self.Z
-        else:
-            charge = self.Q
-        beta = self.beta(gamma)
-        return Nb*charge**2/(m *beta*gamma**2*epsilon*sigma_z)
+        return _space_charge_scaling_factor(Nb, m, gamma, charge, epsilon, sigma_z)
     
     
-    def linearIntensityLimit(self, m, gamma, Nb_0, charge_0, m_0, gamma_0, fully_stripped=True):
+    def linearIntensityLimit(self, m, gamma, Nb_0, charge, charge_0, m_0, gamma_0, beta_0=None):
         """
         Linear intensity limit for new ion species for given bunch intensity 
         Nb_0 and parameters gamma_0, charge0, m_0 from reference ion species - assuming
         that space charge stays constant, and that
         emittance and bunch length are constant for all ion species
+        - charge is Z if fully stripped ion, otherwise Q
+        - reference beta_0 can be provided if already calculated from gamma_0
         """
-        # Specify if fully stripped ion or not
-        if fully_stripped:
-            charge = self.Z
-        else:
-            charge = self.Q
-        beta_0 = self.beta(gamma_0)
-        beta = self.beta(gamma)
-        linearIntensityFactor = (m/m_0)*(charge_0/charge)**2*(beta/beta_0)*(gamma/gamma_0)**2   
-        
+        if beta_0 is None:
+            beta_0 = self.beta(gamma_0)
+        Nb = _linear_limit(float(m), float(gamma), float(Nb_0), float(charge), float(charge_0), 
+                           float(m_0), float(gamma_0), float(beta_0))
         if self.debug_mode:
-            print(f"SPS intensity limit. Type: {self.ion_type}")
-            print("Fully stripped: {}".format(fully_stripped))
-            print("Q = {}, Z = {}".format(self.Q, self.Z))
-            print("Nb_0 = {:.2e}".format(Nb_0))
-            print("m = {:.2e} GeV, m0 = {:.2e} GeV".format(m, m_0))
-            print("charge = {:.1f}, charge_0 = {:.1f}".format(charge, charge_0))
-            print("beta = {:.5f}, beta_0 = {:.5f}".format(beta, beta_0))
-            print("gamma = {:.3f}, gamma_0 = {:.3f}".format(gamma, gamma_0))
-            print('Linear intensity factor: {:.3f}\n'.format(linearIntensityFactor))
-        return Nb_0*linearIntensityFactor 
+            self._print_linear_limit(Nb, m, gamma, Nb_0, charge, charge_0, m_0, gamma_0, beta_0)
+        return Nb
     
     
-    def ion0_referenceValues(self):
+    def _print_linear_limit(self, Nb, m, gamma, Nb_0, charge, charge_0, m_0, gamma_0, beta_0):
+        """
+        Debug printout of linear intensity limit, only called in debug mode
+        """
+        print(f"SPS intensity limit. Type: {self.ion_type}")
+        print("Q = {}, Z = {}".format(self.Q, self.Z))
+        print("Nb_0 = {:.2e}".format(Nb_0))
+        print("m = {:.2e} GeV, m0 = {:.2e} GeV".format(m, m_0))
+        print("charge = {:.1f}, charge_0 = {:.1f}".format(charge, charge_0))
+        print("beta = {:.5f}, beta_0 = {:.5f}".format(self.beta(gamma), beta_0))
+        print("gamma = {:.3f}, gamma_0 = {:.3f}".format(gamma, gamma_0))
+        print('Linear intensity factor: {:.3f}\n'.format(Nb/Nb_0))
+    
+    
+    @classmethod
+    def _pb_reference_values(cls):
         """
-        Sets bunch intensity Nb, gamma factor and mass of reference ion species 
-        As of now, use reference values from Pb from Hannes 
-        For injection and extraction energy, use known Pb ion values from LIU report on 
-        https://edms.cern.ch/ui/file/1420286/2/LIU-Ions_beam_parameter_table.pdf
+        Sets the Pb reference values that only depend on class constants, 
+        computed once on the class the first time an instance needs them
         """
-        # LEIR
-        self.E_kin_per_A_LEIR_inj = 4.2e-3 # kinetic energy per nucleon in LEIR before RF capture, same for all species
-        self.E_kin_per_A_LEIR_extr = 7.22e-2 # kinetic energy per nucleon in LEIR at exit, same for all species
+        if cls._pb_refs_done:
+            return
+        
+        # Pb ion values
+        cls.Z0 = 82.0
         
-        # PS
-        self.E_kin_per_A_PS_inj = 7.22e-2 # GeV/nucleon according to LIU design report 
-        self.E_kin_per_A_PS_extr = 5.9 # GeV/nucleon according to LIU design report 
+        # LEIR - reference case for Pb54+ --> BEFORE stripping
+        cls.Nq0_LEIR_extr = 10e10  # number of observed charges extracted at LEIR
+        cls.Q0_LEIR = 54.0
+        cls.Nb0_LEIR_extr = cls.Nq0_LEIR_extr/cls.Q0_LEIR
         
-        # SPS
-        self.E_kin_per_A_SPS_inj = 5.9 # GeV/nucleon according to LIU design report 
-        self.E_kin_per_A_SPS_extr = 176.4 # GeV/nucleon according to LIU design report 
+        # PS - reference case for Pb54+ --> BEFORE stripping
+        cls.Nq0_PS_extr =  6e10 # from November 2022 ionlifetime MD, previously 8e10  # number of observed charges extracted at PS for nominal beam
+        cls.Q0_PS = 54.0
+        cls.Nb0_PS_extr = cls.Nq0_PS_extr/cls.Q0_PS
         
+        # SPS - reference case for Pb82+ --> AFTER stripping
+        cls.Q0_SPS = 82.0
+        
+        cls._pb_refs_done = True
+    
+    
+    def ion0_referenceValues(self):
+        """
+        Sets bunch intensity Nb of reference ion species 
+        As of now, use reference values from Pb from Hannes 
+        (mass, kinetic energies and gamma factors of Pb are class constants, 
+        reference beta factors are derived from the gamma factors where used)
+        """
         # As of now, reference data exists only for Pb54+
         if self.ion_type_ref == 'Pb':    
+            self._pb_reference_values()
             
-            # Pb ion values
-            self.m0_GeV = 193.687 # rest mass in GeV for Pb reference case 
-            self.Z0 = 82.0
-            
-            # LEIR - reference case for Pb54+ --> BEFORE stripping
-            self.Nq0_LEIR_extr = 10e10  # number of observed charges extracted at LEIR
-            self.Q0_LEIR = 54.0
-            self.Nb0_LEIR_extr = self.Nq0_LEIR_extr/self.Q0_LEIR
-            self.gamma0_LEIR_inj = (self.m0_GeV + self.E_kin_per_A_LEIR_inj * 208)/self.m0_GeV
-            self.gamma0_LEIR_extr = (self.m0_GeV + self.E_kin_per_A_LEIR_extr * 208)/self.m0_GeV
-            
-            # PS - reference case for Pb54+ --> BEFORE stripping
-            self.Nq0_PS_extr =  6e10 # from November 2022 ionlifetime MD, previously 8e10  # number of observed charges extracted at PS for nominal beam
-            self.Q0_PS = 54.0
-            self.Nb0_PS_extr = self.Nq0_PS_extr/self.Q0_PS
-            self.gamma0_PS_inj = (self.m0_GeV + self.E_kin_per_A_PS_inj * 208)/self.m0_GeV
-            self.gamma0_PS_extr = (self.m0_GeV + self.E_kin_per_A_PS_extr * 208)/self.m0_GeV
-            
-            # SPS - reference case for Pb82+ --> AFTER stripping
+            # SPS - outgoing intensity depends on whether SPS transmission is accounted for
             if not self.account_for_SPS_transmission:
                 self.SPS_transmission = 1.0
             self.Nb0_SPS_extr = 2.21e8/self.SPS_transmission # outgoing ions per bunch from SPS (2015 values), adjusted for 62% transmission
-            self.Q0_SPS = 82.0
             self.Nq0_SPS_extr = self.Nb0_SPS_extr*self.Q0_SPS
-            self.gamma0_SPS_inj = (self.m0_GeV + self.E_kin_per_A_SPS_inj * 208)/self.m0_GeV
-            self.gamma0_SPS_extr = (self.m0_GeV + self.E_kin_per_A_SPS_extr * 208)/self.m0_GeV
     
         else:
             raise ValueError('Other reference ion type than Pb does not yet exist!')
+    
+    
+    def _lin_limit_constants(self):
+        """
+        Reference ion constants k of _lin_limit at LEIR extraction, PS injection, PS extraction 
+        and SPS injection, from the current reference values
+        """
+        return (_lin_limit_constant(self.Nb0_LEIR_extr, self.Q0_LEIR, self.m0_GeV, _beta(self.gamma0_LEIR_extr), self.gamma0_LEIR_extr),
+                _lin_limit_constant(self.Nb0_PS_extr, self.Q0_PS, self.m0_GeV, _beta(self.gamma0_PS_inj), self.gamma0_PS_inj),
+                _lin_limit_constant(self.Nb0_PS_extr, self.Q0_PS, self.m0_GeV, _beta(self.gamma0_PS_extr), self.gamma0_PS_extr),
+                _lin_limit_constant(self.Nb0_SPS_extr, self.Q0_SPS, self.m0_GeV, _beta(self.gamma0_SPS_inj), self.gamma0_SPS_inj))
    
     
     def linac3(self):
@@ -240,18 +437,18 @@ class InjectorChain:
             self.gamma_LEIR_inj = self.LEIR_gamma_inj_ref
             self.gamma_LEIR_extr = self.LEIR_gamma_extr_ref
         else: 
-            self.gamma_LEIR_inj = (self.mass_GeV + self.E_kin_per_A_LEIR_inj * self.A)/self.mass_GeV
-            self.gamma_LEIR_extr = (self.mass_GeV + self.E_kin_per_A_LEIR_extr * self.A)/self.mass_GeV
+            self.gamma_LEIR_inj = 1 + self.E_kin_per_A_LEIR_inj * self.A_over_m
+            self.gamma_LEIR_extr = 1 + self.E_kin_per_A_LEIR_extr * self.A_over_m
                 
         # Estimate number of charges at extraction - 10e10 charges for Pb54+, use this as scaling 
         self.Nb_LEIR_extr = self.linearIntensityLimit(
                                                m = self.mass_GeV, 
                                                gamma = self.gamma_LEIR_extr,  
                                                Nb_0 = self.Nb0_LEIR_extr, 
+                                               charge = self.Q, # partially stripped charged state
                                                charge_0 = self.Q0_LEIR, # partially stripped charged state 
                                                m_0 = self.m0_GeV,  
-                                               gamma_0 = self.gamma0_LEIR_extr,  # use gamma at extraction
-                                               fully_stripped=False
+                                               gamma_0 = self.gamma0_LEIR_extr  # use gamma at extraction
                                                )
         
         self.Nq_LEIR_extr = self.Nb_LEIR_extr*self.Q  # number of outgoing charges, before any stripping
@@ -273,18 +470,18 @@ class InjectorChain:
             self.gamma_PS_inj = self.PS_gamma_inj_ref
             self.gamma_PS_extr = self.PS_gamma_extr_ref
         else:         
-            self.gamma_PS_inj = (self.mass_GeV + self.E_kin_per_A_PS_inj * self.A)/self.mass_GeV
-            self.gamma_PS_extr = (self.mass_GeV + self.E_kin_per_A_PS_extr * self.A)/self.mass_GeV
+            self.gamma_PS_inj = 1 + self.E_kin_per_A_PS_inj * self.A_over_m
+            self.gamma_PS_extr = 1 + self.E_kin_per_A_PS_extr * self.A_over_m
         
         # Estimate number of charges at extraction
         self.Nb_PS_extr = self.linearIntensityLimit(
                                                 m = self.mass_GeV, 
                                                 gamma = self.gamma_PS_extr,  
                                                 Nb_0 = self.Nb0_PS_extr, 
+                                                charge = self.Q, # partially stripped charged state
                                                 charge_0 = self.Q0_PS, # partially stripped charged state 
                                                 m_0 = self.m0_GeV,  
-                                                gamma_0 = self.gamma0_PS_extr,  # use gamma at extraction,
-                                                fully_stripped=False
+                                                gamma_0 = self.gamma0_PS_extr  # use gamma at extraction,
                                                 )
         self.Nq_PS_extr = self.Nb_PS_extr*self.Q  # number of outgoing charges, before any stripping
 
@@ -306,8 +503,8 @@ class InjectorChain:
             self.gamma_SPS_inj = self.SPS_gamma_inj_ref
             self.gamma_SPS_extr = self.SPS_gamma_extr_ref
         else:     
-            self.gamma_SPS_inj = (self.mass_GeV + self.E_kin_per_A_SPS_inj * self.A)/self.mass_GeV
-            self.gamma_SPS_extr = (self.mass_GeV + self.E_kin_per_A_SPS_extr * self.A)/self.mass_GeV
+            self.gamma_SPS_inj = 1 + self.E_kin_per_A_SPS_inj * self.A_over_m
+            self.gamma_SPS_extr = 1 + self.E_kin_per_A_SPS_extr * self.A_over_m
          
             # For comparison on how Roderik scales the gamma - scale directly with charge/mass before stripping 
             # (same magnetic rigidity at PS extraction for all ion species)
@@ -320,10 +517,9 @@ class InjectorChain:
                 # Brho = P/Q is constant at PS extraction and SPS injection
                 # Use P = m*gamma*beta*c
                 # gamma = np.sqrt(1 + ((Q/Q0)/(m/m0))**2 + (gamma0**2 - 1))
-                self.gamma_SPS_inj =  np.sqrt(
-                                        1 + (((self.Z if self.LEIR_PS_strip else self.Q) / 54) / (self.mass_GeV/self.m0_GeV))**2
-                                        * (self.gamma0_SPS_inj**2 - 1)
-                                    )
+                q_over_54 = (self.Z if self.LEIR_PS_strip else self.Q) * (1.0/54.0)
+                ratio = q_over_54 / (self.mass_GeV/self.m0_GeV)
+                self.gamma_SPS_inj = math.sqrt(1 + ratio*ratio * (self.gamma0_SPS_inj*self.gamma0_SPS_inj - 1))
                 #print("{}: gamma SPS inj: {}".format(self.ion_type, self.gamma_SPS_inj))
         
         # Calculate outgoing intensity from linear scaling 
@@ -331,10 +527,10 @@ class InjectorChain:
                                                m = self.mass_GeV, 
                                                gamma = self.gamma_SPS_inj,  
                                                Nb_0 = self.Nb0_SPS_extr, 
+                                               charge = self.Z, # fully stripped
                                                charge_0 = self.Q0_SPS, 
                                                m_0 = self.m0_GeV,  
-                                               gamma_0 = self.gamma0_SPS_inj,  # use gamma at extraction
-                                               fully_stripped=True
+                                               gamma_0 = self.gamma0_SPS_inj  # use gamma at extraction
                                                )
     
         self.Nq_SPS_extr = self.Nb_SPS_extr*self.Z  # number of outgoing charges
@@ -358,46 +554,68 @@ class InjectorChain:
         self.space_charge_tune_shift()
 
 
+    def _all_gammas(self, ion_types, m, A, Z, Q):
+        """
+        Relativistic gamma at injection and extraction of LEIR, PS and SPS 
+        for arrays of ion properties at once, following leir(), ps() and sps()
+        - returns array of shape (N, 6) with columns in the order of _energy_columns
+        """
+        if self.use_gammas_ref:
+            keys = ['{}{}{}'.format(int(q), ion_type, int(a)) for q, ion_type, a in zip(Q, ion_types, A)]
+            return np.array([self._energy_lut[key] for key in keys])
+        
+        E_kin_per_A = np.array([self.E_kin_per_A_LEIR_inj, self.E_kin_per_A_LEIR_extr, self.E_kin_per_A_PS_inj, 
+                                self.E_kin_per_A_PS_extr, self.E_kin_per_A_SPS_inj, self.E_kin_per_A_SPS_extr])
+        gammas = 1 + np.outer(A/m, E_kin_per_A)
+        
+        # Same magnetic rigidity scaling of SPS injection gamma as in sps()
+        if self.use_Roderiks_gamma:
+            ratio = ((Z if self.LEIR_PS_strip else Q) * (1.0/54.0)) / (m/self.m0_GeV)
+            gammas[:, 4] = np.sqrt(1 + ratio*ratio * (self.gamma0_SPS_inj*self.gamma0_SPS_inj - 1))
+        
+        return gammas
+        
+    
     def simulate_SpaceCharge_intensity_limit_all_ions(self, return_dataframe=True):
         """
         Calculate intensity limits with linear space charge in 
         Linac3, LEIR, PS and SPS for all ions given in table
         """
         
-        # Initiate row of ions per bunch (Nb) and charges per bunch (Nq)
-        self.ion_Nb_data = pd.DataFrame(index=self.full_ion_data.transpose().index)
-        self.ion_Nb_data["Nb_LEIR"] = np.NaN
-        self.ion_Nb_data["Nq_LEIR"] = np.NaN
-        self.ion_Nb_data["Nb_PS"] = np.NaN
-        self.ion_Nb_data["Nq_PS"] = np.NaN
-        self.ion_Nb_data["Nb_SPS"] = np.NaN
-        self.ion_Nb_data["Nq_SPS"] = np.NaN
-        
-        # Create dataframes or gamma injection and extraction data 
-        self.ion_gamma_inj_data = pd.DataFrame(columns=['LEIR', 'PS', 'SPS'], 
-                                               index=self.full_ion_data.transpose().index)
-        self.ion_gamma_extr_data = self.ion_gamma_inj_data.copy()
-        
-        # Iterate over all ions in data 
-        for i, ion_type in enumerate(self.full_ion_data.columns):
-            self.init_ion(ion_type)
-            self.simulate_injection_SpaceCharge_limit()
-            
-            # Add the intensities into a table 
-            self.ion_Nb_data["Nb_LEIR"][ion_type] = self.Nb_LEIR_extr
-            self.ion_Nb_data["Nq_LEIR"][ion_type] = self.Nq_LEIR_extr
-            self.ion_Nb_data["Nb_PS"][ion_type] = self.Nb_PS_extr
-            self.ion_Nb_data["Nq_PS"][ion_type] = self.Nq_PS_extr
-            self.ion_Nb_data["Nb_SPS"][ion_type] = self.Nb_SPS_extr
-            self.ion_Nb_data["Nq_SPS"][ion_type] = self.Nq_SPS_extr
-
-            # Add the gamma of injection and extraction into a table 
-            self.ion_gamma_inj_data['LEIR'][ion_type] = self.gamma_LEIR_inj
-            self.ion_gamma_extr_data['LEIR'][ion_type] = self.gamma_LEIR_extr
-            self.ion_gamma_inj_data['PS'][ion_type] = self.gamma_PS_inj
-            self.ion_gamma_extr_data['PS'][ion_type] = self.gamma_PS_extr
-            self.ion_gamma_inj_data['SPS'][ion_type] = self.gamma_SPS_inj
-            self.ion_gamma_extr_data['SPS'][ion_type] = self.gamma_SPS_extr
+        ion_types = self._ion_names
+        m, A, Z, Q = self._props.m, self._props.A, self._props.Z, self._props.Q
+        
+        # As a loop over init_ion for all ions, reset the default efficiencies (e.g. SPS_transmission) 
+        # and leave the last ion initialized
+        self.init_ion(ion_types[-1])
+        
+        (gamma_LEIR_inj, gamma_LEIR_extr, gamma_PS_inj, 
+         gamma_PS_extr, gamma_SPS_inj, gamma_SPS_extr) = self._all_gammas(ion_types, m, A, Z, Q).T
+        
+        # Linear space charge limits - partially stripped in LEIR and PS, fully stripped in SPS
+        k_LEIR_extr, _, k_PS_extr, k_SPS_inj = self._lin_limit_constants()
+        Nb_LEIR = _lin_limit(m, gamma_LEIR_extr, k_LEIR_extr, Q)
+        Nb_PS = _lin_limit(m, gamma_PS_extr, k_PS_extr, Q)
+        Nb_SPS = _lin_limit(m, gamma_SPS_inj, k_SPS_inj, Z)
+        
+        # Tables of ions per bunch (Nb) and charges per bunch (Nq), and of gammas at injection and extraction
+        self.ion_Nb_data = pd.DataFrame({
+                                "Nb_LEIR": Nb_LEIR,
+                                "Nq_LEIR": Nb_LEIR*Q,
+                                "Nb_PS": Nb_PS,
+                                "Nq_PS": Nb_PS*Q,
+                                "Nb_SPS": Nb_SPS,
+                                "Nq_SPS": Nb_SPS*Z
+                                }, index=ion_types)
+        self.ion_gamma_inj_data = pd.DataFrame({'LEIR': gamma_LEIR_inj, 
+                                                'PS': gamma_PS_inj, 
+                                                'SPS': gamma_SPS_inj}, index=ion_types)
+        self.ion_gamma_extr_data = pd.DataFrame({'LEIR': gamma_LEIR_extr, 
+                                                 'PS': gamma_PS_extr, 
+                                                 'SPS': gamma_SPS_extr}, index=ion_types)
+
+        # Per-ion values of the last ion, as after a loop over all ions
+        self.simulate_injection_SpaceCharge_limit()
 
         if return_dataframe:
             return self.ion_Nb_data 
@@ -409,93 +627,98 @@ class InjectorChain:
         through Linac3, LEIR, PS and SPS considering all the limits of the injectors
         """
         self.simulate_injection_SpaceCharge_limit()
+        result = self._LHC_bunch_intensity_chain([self.ion_type], 
+                                                 *(np.array([value]) for value in (self.mass_GeV, self.A, self.Z, self.Q, 
+                                                                                   self.linac3_current, self.linac3_pulseLength, 
+                                                                                   self.LEIR_PS_stripping_efficiency,
+                                                                                   self.gamma_LEIR_inj, self.gamma_LEIR_extr, 
+                                                                                   self.gamma_PS_inj, self.gamma_SPS_inj)))
+        
+        # Values of the single ion as plain numbers, with the ion type before the optional LEIR-PS stripping key
+        result = {key: value.item() if isinstance(value, np.ndarray) else value for key, value in result.items()}
+        result["Ion"] = self.ion_type
+        if self.LEIR_PS_strip:
+            result["LEIR_PS_strippingEfficiency"] = result.pop("LEIR_PS_strippingEfficiency")
+    
+        return result
+
+
+    def _LHC_bunch_intensity_chain(self, ion_types, m, A, Z, Q, linac3_current, linac3_pulseLength, 
+                                   LEIR_PS_stripping_efficiency, gamma_LEIR_inj, gamma_LEIR_extr, gamma_PS_inj, gamma_SPS_inj):
+        """
+        Chain of intensity limits through Linac3, LEIR, PS and SPS for arrays of ion properties and gammas, 
+        shared by calculate_LHC_bunch_intensity and calculate_LHC_bunch_intensity_all_ion_species
+        - returns dictionary of result columns
+        """
+        k_LEIR_extr, k_PS_inj, _, k_SPS_inj = self._lin_limit_constants()
+        
         # Calculate ion transmission for LEIR 
-        ionsPerPulseLinac3 = (self.linac3_current * self.linac3_pulseLength) / (self.Q * e)
-        spaceChargeLimitLEIR = self.linearIntensityLimit(
-                                               m = self.mass_GeV, 
-                                               gamma = self.gamma_LEIR_extr,  
-                                               Nb_0 = self.Nb0_LEIR_extr, 
-                                               charge_0 = self.Q0_LEIR, # partially stripped charged state 
-                                               m_0 = self.m0_GeV,  
-                                               gamma_0 = self.gamma0_LEIR_extr,  # use gamma at LEIR extraction
-                                               fully_stripped=False
-                                               )
+        ionsPerPulseLinac3 = (linac3_current * linac3_pulseLength) / (Q * e)
+        spaceChargeLimitLEIR = _lin_limit(m, gamma_LEIR_extr, k_LEIR_extr, Q)
+        
+        ionsInjectedPerPulseLEIR = ionsPerPulseLinac3 * self.LEIR_injection_efficiency
+        if self.nPulsesLEIR == 0:
+            nPulsesLEIR = np.minimum(7, np.ceil(spaceChargeLimitLEIR / ionsInjectedPerPulseLEIR)).astype(int)
+        else:
+            nPulsesLEIR = np.full(len(m), self.nPulsesLEIR)
+        totalIntLEIR = ionsInjectedPerPulseLEIR * nPulsesLEIR
         
-        nPulsesLEIR = (min(7, math.ceil(spaceChargeLimitLEIR / (ionsPerPulseLinac3 * self.LEIR_injection_efficiency))) if self.nPulsesLEIR == 0 else self.nPulsesLEIR)
-        totalIntLEIR = ionsPerPulseLinac3*nPulsesLEIR * self.LEIR_injection_efficiency
-     
         # Calculate extracted intensity per bunch
-        ionsPerBunchExtractedLEIR = self.LEIR_transmission * np.min([totalIntLEIR, spaceChargeLimitLEIR]) / self.LEIR_bunches
-        ionsPerBunchExtractedPS = ionsPerBunchExtractedLEIR *(self.LEIR_PS_stripping_efficiency if self.LEIR_PS_strip else 1) * self.PS_transmission / self.PS_splitting
-
-        spaceChargeLimitPS = self.linearIntensityLimit(
-                                        m = self.mass_GeV, 
-                                        gamma = self.gamma_PS_inj,  
-                                        Nb_0 = self.Nb0_PS_extr, 
-                                        charge_0 = self.Q0_PS, # partially stripped charged state 
-                                        m_0 = self.m0_GeV,  
-                                        gamma_0 = self.gamma0_PS_inj,  # use gamma at PS inj
-                                        fully_stripped = self.LEIR_PS_strip # fully stripped if LEIR-PS strip
-                                        )
+        ionsPerBunchExtractedLEIR = self.LEIR_transmission * np.minimum(totalIntLEIR, spaceChargeLimitLEIR) / self.LEIR_bunches
+        ionsPerBunchExtractedPS = ionsPerBunchExtractedLEIR *(LEIR_PS_stripping_efficiency if self.LEIR_PS_strip else 1) * self.PS_transmission / self.PS_splitting
+        spaceChargeLimitPS = _lin_limit(m, gamma_PS_inj, k_PS_inj, Z if self.LEIR_PS_strip else Q)
         
         # If space charge limit in PS is considered, choose the minimum between the SC limit and the extracted ionsPerBunchPS
         if self.consider_PS_space_charge_limit:
-            ionsPerBunchPS = min(spaceChargeLimitPS, ionsPerBunchExtractedPS)
-            if spaceChargeLimitPS < ionsPerBunchExtractedPS:
-                print("\nIon type: {}".format(self.ion_type))
-                print("Space charge limit PS: {:.3e} vs extracted ions PS: {:.3e}".format(spaceChargeLimitPS, ionsPerBunchExtractedPS))
+            ionsPerBunchPS = np.minimum(spaceChargeLimitPS, ionsPerBunchExtractedPS)
+            for j in np.flatnonzero(spaceChargeLimitPS < ionsPerBunchExtractedPS):
+                print("\nIon type: {}".format(ion_types[j]))
+                print("Space charge limit PS: {:.3e} vs extracted ions PS: {:.3e}".format(spaceChargeLimitPS[j], ionsPerBunchExtractedPS[j]))
         else:
             ionsPerBunchPS = ionsPerBunchExtractedPS
-        #print("Space charge limit PS: {:.3e} vs extracted ions PS: {:.3e}".format(spaceChargeLimitPS, ionsPerBunchExtractedPS))
-
+        
         # Calculate ion transmission for SPS 
-        ionsPerBunchSPSinj = ionsPerBunchPS * (self.PS_SPS_transmission_efficiency if self.Z == self.Q or self.LEIR_PS_strip else self.PS_SPS_stripping_efficiency)
-        spaceChargeLimitSPS = self.linearIntensityLimit(
-                                               m = self.mass_GeV, 
-                                               gamma = self.gamma_SPS_inj,  
-                                               Nb_0 = self.Nb0_SPS_extr, 
-                                               charge_0 = self.Q0_SPS, 
-                                               m_0 = self.m0_GeV,  
-                                               gamma_0 = self.gamma0_SPS_inj, # use gamma at SPS inj
-                                               fully_stripped=True
-                                               )
-        ionsPerBunchLHC = min(spaceChargeLimitSPS, ionsPerBunchSPSinj) * self.SPS_transmission * self.SPS_slipstacking_transmission
-    
+        ionsPerBunchSPSinj = ionsPerBunchPS * np.where((Z == Q) | self.LEIR_PS_strip, 
+                                                       self.PS_SPS_transmission_efficiency, 
+                                                       self.PS_SPS_stripping_efficiency)
+        spaceChargeLimitSPS = _lin_limit(m, gamma_SPS_inj, k_SPS_inj, Z)
+        SPS_accIntensity = np.minimum(spaceChargeLimitSPS, ionsPerBunchSPSinj)
+        ionsPerBunchLHC = SPS_accIntensity * self.SPS_transmission * self.SPS_slipstacking_transmission
+        
         result = {
-            "chargeBeforeStrip": int(self.Q),
-            "atomicNumber": int(self.Z),
-            "massNumber": int(self.A),
-            "Linac3_current [A]": self.linac3_current,
-            "Linac3_pulse_length [s]": self.linac3_pulseLength, 
+            "chargeBeforeStrip": Q.astype(int),
+            "atomicNumber": Z.astype(int),
+            "massNumber": A.astype(int),
+            "Linac3_current [A]": linac3_current,
+            "Linac3_pulse_length [s]": linac3_pulseLength, 
             "Linac3_ionsPerPulse": ionsPerPulseLinac3,
             "LEIR_numberofPulses": nPulsesLEIR,
             "LEIR_injection_efficiency": self.LEIR_injection_efficiency, 
             "LEIR_maxIntensity": totalIntLEIR,
             "LEIR_space_charge_limit": spaceChargeLimitLEIR,
             "LEIR_splitting": self.LEIR_bunches,
-            "LEIR_gamma": self.gamma_LEIR_inj,
+            "LEIR_gamma": gamma_LEIR_inj,
             "LEIR_extractedIonPerBunch": ionsPerBunchExtractedLEIR,
             "LEIR_transmission": self.LEIR_transmission, 
             "PS_space_charge_limit": spaceChargeLimitPS,
             "PS_splitting": self.PS_splitting, 
             "PS_transmission": self.PS_transmission, 
             "PS_ionsExtractedPerBunch": ionsPerBunchExtractedPS,
-            "gammaInjSPS": self.gamma_SPS_inj,
+            "gammaInjSPS": gamma_SPS_inj,
             "PS_SPS_stripping_efficiency": self.PS_SPS_stripping_efficiency, 
             "SPS_maxIntensityPerBunch": ionsPerBunchSPSinj,
             "SPS_spaceChargeLimit": spaceChargeLimitSPS,
-            "SPS_inj_gamma": self.gamma_SPS_inj, 
-            "SPS_accIntensity": min(spaceChargeLimitSPS, ionsPerBunchSPSinj),
+            "SPS_inj_gamma": gamma_SPS_inj, 
+            "SPS_accIntensity": SPS_accIntensity,
             "SPS_transmission": self.SPS_transmission, 
             "LHC_ionsPerBunch": ionsPerBunchLHC,
-            "LHC_chargesPerBunch": ionsPerBunchLHC * self.Z,
-            "Ion": self.ion_type
+            "LHC_chargesPerBunch": ionsPerBunchLHC * Z
         }
         
         # Add key of LEIR-PS stripping efficiency if this is done 
         if self.LEIR_PS_strip:
-            result["LEIR_PS_strippingEfficiency"] = self.LEIR_PS_stripping_efficiency
-    
+            result["LEIR_PS_strippingEfficiency"] = LEIR_PS_stripping_efficiency
+        
         return result
 
 
@@ -504,32 +727,37 @@ class InjectorChain:
         Estimate LHC bunch intensity for all ion species provided in table
         through Linac3, LEIR, PS and SPS considering all the limits of the injectors
         """
-        # Initialize full dicionary
-        full_result = defaultdict(list)
+        ion_types = self._ion_names
+        m, A, Z, Q = self._props.m, self._props.A, self._props.Z, self._props.Q
         
-        # Iterate over all ions in data 
-        for i, ion_type in enumerate(self.full_ion_data.columns):
-            # Initiate the correct ion
-            self.init_ion(ion_type)
-            result = self.calculate_LHC_bunch_intensity()
-         
-            # Append the values to the corresponding key 
-            for key, value in result.items():
-                full_result[key].append(value)
-            
-            del result
-            
-        # Convert dictionary to dataframe 
-        df_all_ions = pd.DataFrame(full_result)
-        df_all_ions = df_all_ions.set_index("Ion")
+        # As a loop over init_ion for all ions, reset the default efficiencies (e.g. SPS_transmission) 
+        # and leave the last ion initialized
+        self.init_ion(ion_types[-1])
+        
+        # Same chain of limits as in calculate_LHC_bunch_intensity, evaluated for all ions at once
+        gamma_LEIR_inj, gamma_LEIR_extr, gamma_PS_inj, _, gamma_SPS_inj, _ = self._all_gammas(ion_types, m, A, Z, Q).T
+        result = self._LHC_bunch_intensity_chain(ion_types, m, A, Z, Q, 
+                                                 self._props.linac3_I * 1e-6, self._props.linac3_T * 1e-6, 
+                                                 self._props.LEIR_PS_eff, 
+                                                 gamma_LEIR_inj, gamma_LEIR_extr, gamma_PS_inj, gamma_SPS_inj)
+        
+        # Per-ion values of the last ion, as after a loop over all ions
+        self.simulate_injection_SpaceCharge_limit()
+        
+        # Convert dictionary of arrays to dataframe in one go
+        df_all_ions = pd.DataFrame(result, index=ion_types.rename("Ion"))
         
-        # Save CSV file if desired 
+        # Save CSV file if desired - large or small floats in exponential form, other floats at full precision
         if save_csv:
-            float_columns = df_all_ions.select_dtypes(include=['float']).columns
             df_save = df_all_ions.copy()
-            df_save[float_columns]  = df_save[float_columns].applymap(self.format_large_numbers)
-            df_save = df_save.T
-            df_save.to_csv("{}/{}.csv".format(self.save_path, output_name))
+            for column in df_save.select_dtypes(include=['float']).columns:
+                values = df_save[column].to_numpy()
+                exponential = (np.abs(values) >= 1e6) | (np.abs(values) < 1e-3)
+                strings = np.empty(len(values), dtype=object)
+                strings[exponential] = np.char.mod('%.5e', values[exponential])
+                strings[~exponential] = values[~exponential].astype(str)
+                df_save[column] = strings
+            df_save.T.to_csv("{}/{}.csv".format(self.save_path, output_name))
             
         return df_all_ions
     
@@ -540,4 +768,4 @@ class InjectorChain:
         """
         if abs(x) >= 1e6 or abs(x) < 1e-3:
             return f'{x:.5e}'
-        return x
\ No newline at end of file
+        return x
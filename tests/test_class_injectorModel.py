@@ -5,8 +5,11 @@ General test class for Injector Class to check
 - incoming bunch intensity to the LHC 
 """
 from injector_model import InjectorChain
+import injector_model.injector_model as injector_model_module
 import pandas as pd
 import numpy as np
+import pytest
+import os
 
 # Import data 
 ion_data = pd.read_csv("../data/Ion_species.csv", sep=';', header=0, index_col=0).T
@@ -79,4 +82,147 @@ class TestClass_injectorModel_linearSpaceCharge:
                                         )
         df_no_ps_splitting_and_ps_leir_strip = injector_chain4.calculate_LHC_bunch_intensity_all_ion_species()
         assert np.all(np.isclose(ref_val['No_PS_split_and_LEIR_PS_strip'].values, 
-                          df_no_ps_splitting_and_ps_leir_strip['LHC_chargesPerBunch'].values, rtol=1e-2))   
\ No newline at end of file
+                          df_no_ps_splitting_and_ps_leir_strip['LHC_chargesPerBunch'].values, rtol=1e-2))
+
+
+class TestClass_injectorModel_allIonSpecies:
+    """
+    Test class for comparing the vectorized calculation for all ion species 
+    versus the calculation for one ion species at a time
+    """
+    
+    def injector_chain(self, LEIR_PS_strip, use_gammas_ref, account_for_SPS_transmission):
+        return InjectorChain(ion_type, 
+                             ion_data, 
+                             nPulsesLEIR = 0,
+                             LEIR_bunches = 2,
+                             PS_splitting = 2,
+                             account_for_SPS_transmission=account_for_SPS_transmission,
+                             LEIR_PS_strip=LEIR_PS_strip,
+                             consider_PS_space_charge_limit=True,
+                             use_gammas_ref=use_gammas_ref
+                             )
+    
+    
+    @pytest.mark.parametrize('LEIR_PS_strip', [False, True])
+    @pytest.mark.parametrize('use_gammas_ref', [False, True])
+    @pytest.mark.parametrize('account_for_SPS_transmission', [False, True])
+    def test_all_ion_species_vs_single_ion(self, LEIR_PS_strip, use_gammas_ref, account_for_SPS_transmission):
+        injector_chain = self.injector_chain(LEIR_PS_strip, use_gammas_ref, account_for_SPS_transmission)
+        df_all_ions = injector_chain.calculate_LHC_bunch_intensity_all_ion_species()
+        
+        # Initiate and calculate one ion species at a time
+        injector_chain_single = self.injector_chain(LEIR_PS_strip, use_gammas_ref, account_for_SPS_transmission)
+        results = []
+        for ion in ion_data.columns:
+            injector_chain_single.init_ion(ion)
+            results.append(injector_chain_single.calculate_LHC_bunch_intensity())
+        df_single_ions = pd.DataFrame(results).set_index("Ion")
+        
+        pd.testing.assert_frame_equal(df_all_ions, df_single_ions, check_dtype=False, rtol=1e-10)
+
+
+    @pytest.mark.parametrize('LEIR_PS_strip', [False, True])
+    @pytest.mark.parametrize('use_gammas_ref', [False, True])
+    def test_space_charge_limits_all_ions_vs_single_ion(self, LEIR_PS_strip, use_gammas_ref):
+        injector_chain = self.injector_chain(LEIR_PS_strip, use_gammas_ref, True)
+        injector_chain.simulate_SpaceCharge_intensity_limit_all_ions()
+        
+        # Initiate and simulate one ion species at a time
+        injector_chain_single = self.injector_chain(LEIR_PS_strip, use_gammas_ref, True)
+        Nb_data, gamma_inj_data, gamma_extr_data = {}, {}, {}
+        for ion in ion_data.columns:
+            injector_chain_single.init_ion(ion)
+            injector_chain_single.simulate_injection_SpaceCharge_limit()
+            Nb_data[ion] = {"Nb_LEIR": injector_chain_single.Nb_LEIR_extr, 
+                            "Nq_LEIR": injector_chain_single.Nq_LEIR_extr, 
+                            "Nb_PS": injector_chain_single.Nb_PS_extr, 
+                            "Nq_PS": injector_chain_single.Nq_PS_extr, 
+                            "Nb_SPS": injector_chain_single.Nb_SPS_extr, 
+                            "Nq_SPS": injector_chain_single.Nq_SPS_extr}
+            gamma_inj_data[ion] = {'LEIR': injector_chain_single.gamma_LEIR_inj, 
+                                   'PS': injector_chain_single.gamma_PS_inj, 
+                                   'SPS': injector_chain_single.gamma_SPS_inj}
+            gamma_extr_data[ion] = {'LEIR': injector_chain_single.gamma_LEIR_extr, 
+                                    'PS': injector_chain_single.gamma_PS_extr, 
+                                    'SPS': injector_chain_single.gamma_SPS_extr}
+        
+        pd.testing.assert_frame_equal(injector_chain.ion_Nb_data, pd.DataFrame.from_dict(Nb_data, orient='index'), 
+                                      check_dtype=False, check_index_type=False, check_names=False, rtol=1e-10)
+        pd.testing.assert_frame_equal(injector_chain.ion_gamma_inj_data, pd.DataFrame.from_dict(gamma_inj_data, orient='index'), 
+                                      check_dtype=False, check_index_type=False, check_names=False, rtol=1e-10)
+        pd.testing.assert_frame_equal(injector_chain.ion_gamma_extr_data, pd.DataFrame.from_dict(gamma_extr_data, orient='index'), 
+                                      check_dtype=False, check_index_type=False, check_names=False, rtol=1e-10)
+    
+    
+    def test_reassigned_ion_data_table(self):
+        injector_chain = self.injector_chain(False, False, True)
+        assert injector_chain.ion_data['mass [GeV]'] == ion_data[ion_type]['mass [GeV]']
+        
+        # A new table with a subset of ions is used by init_ion and the all-ion calculations
+        ion_subset = list(ion_data.columns[:3]) + [ion_type]
+        injector_chain.full_ion_data = ion_data[ion_subset]
+        injector_chain.init_ion(ion_subset[0])
+        assert injector_chain.ion_data.equals(ion_data[ion_subset[0]])
+        assert list(injector_chain.calculate_LHC_bunch_intensity_all_ion_species().index) == ion_subset
+
+
+class TestClass_injectorModel_energyTables:
+    """
+    Test class for loading reference gammas from the npz lookup table or the csv ion injection energy table
+    """
+    
+    def energy_table(self, tmp_path, monkeypatch, scale=1.0):
+        # Point all scenarios to tables in the temporary directory
+        monkeypatch.setattr(injector_model_module, '_energy_table_path', 
+                            lambda LEIR_PS_strip, higher_brho_LEIR, extension: str(tmp_path / 'energies.{}'.format(extension)))
+        return pd.DataFrame({'Ion': ['54Pb208', '4O16'], 
+                             **{column: scale*np.array([1.1 + i, 1.2 + i]) 
+                                for i, column in enumerate(injector_model_module._energy_columns)}})
+    
+    
+    def write_npz(self, df, tmp_path):
+        np.savez(tmp_path / 'energies.npz', 
+                 ion_codes=df['Ion'].to_numpy(dtype=str), 
+                 energies=df[injector_model_module._energy_columns].to_numpy(dtype=float))
+    
+    
+    def test_csv_fallback(self, tmp_path, monkeypatch):
+        df = self.energy_table(tmp_path, monkeypatch)
+        df.to_csv(tmp_path / 'energies.csv', index=False)
+        lut = injector_model_module._load_energy_lut(False, False)
+        assert np.array_equal(lut['4O16'], df[injector_model_module._energy_columns].to_numpy()[1])
+    
+    
+    def test_npz_preferred_over_older_csv(self, tmp_path, monkeypatch):
+        df = self.energy_table(tmp_path, monkeypatch)
+        df.to_csv(tmp_path / 'energies.csv', index=False)
+        df_npz = self.energy_table(tmp_path, monkeypatch, scale=2.0)
+        self.write_npz(df_npz, tmp_path)
+        os.utime(tmp_path / 'energies.csv', (1e9, 1e9))
+        lut = injector_model_module._load_energy_lut(False, False)
+        assert np.array_equal(lut['54Pb208'], df_npz[injector_model_module._energy_columns].to_numpy()[0])
+    
+    
+    def test_newer_csv_preferred_over_npz(self, tmp_path, monkeypatch):
+        df = self.energy_table(tmp_path, monkeypatch)
+        df.to_csv(tmp_path / 'energies.csv', index=False)
+        self.write_npz(self.energy_table(tmp_path, monkeypatch, scale=2.0), tmp_path)
+        os.utime(tmp_path / 'energies.npz', (1e9, 1e9))
+        lut = injector_model_module._load_energy_lut(False, False)
+        assert np.array_equal(lut['54Pb208'], df[injector_model_module._energy_columns].to_numpy()[0])
+    
+    
+    def test_ion_energy_data_copy_and_setter(self, tmp_path, monkeypatch):
+        df = self.energy_table(tmp_path, monkeypatch)
+        df.to_csv(tmp_path / 'energies.csv', index=False)
+        injector_chain = InjectorChain(ion_type, ion_data, use_gammas_ref=True)
+        
+        # Modifying the table of one instance does not affect other instances
+        injector_chain.ion_energy_data.loc['54Pb208', 'LEIR_gamma_inj'] = 5.0
+        assert InjectorChain(ion_type, ion_data).ion_energy_data.loc['54Pb208', 'LEIR_gamma_inj'] == 1.1
+        
+        # An assigned table is used for the reference gammas
+        injector_chain.ion_energy_data = injector_chain.ion_energy_data
+        injector_chain.init_ion(ion_type)
+        assert injector_chain.LEIR_gamma_inj_ref == 5.0